@@ -0,0 +1,257 @@
+// matching core, free of any python types.
+//
+// price levels live in a BTreeMap keyed by integer tick (best is the first
+// ask / last bid, depth is an in-order walk). each level is an intrusive
+// doubly-linked fifo threaded through one slab of nodes, and every resting
+// order is indexed by oid so cancel can unlink it in O(1).
+//
+// lib.rs puts a c abi over it for obook.native_lob.
+
+use std::collections::btree_map::{BTreeMap, OccupiedEntry};
+use std::collections::VecDeque;
+
+use rustc_hash::FxHashMap;
+
+pub const BUY: u8 = 0;
+pub const SELL: u8 = 1;
+
+const NIL: u32 = u32::MAX;
+
+struct Node {
+    oid: u64,
+    qty: i64,
+    prev: u32,
+    next: u32,
+}
+
+pub struct Level {
+    head: u32,
+    tail: u32,
+    pub vol: i64,
+}
+
+impl Level {
+    fn new() -> Self {
+        Level { head: NIL, tail: NIL, vol: 0 }
+    }
+}
+
+#[derive(Default)]
+struct Slab {
+    nodes: Vec<Node>,
+    free: Vec<u32>,
+}
+
+impl Slab {
+    fn alloc(&mut self, oid: u64, qty: i64) -> u32 {
+        let node = Node { oid, qty, prev: NIL, next: NIL };
+        match self.free.pop() {
+            Some(i) => {
+                self.nodes[i as usize] = node;
+                i
+            }
+            None => {
+                self.nodes.push(node);
+                (self.nodes.len() - 1) as u32
+            }
+        }
+    }
+
+    fn push_back(&mut self, lvl: &mut Level, i: u32) {
+        self.nodes[i as usize].prev = lvl.tail;
+        if lvl.tail == NIL {
+            lvl.head = i;
+        } else {
+            self.nodes[lvl.tail as usize].next = i;
+        }
+        lvl.tail = i;
+        lvl.vol += self.nodes[i as usize].qty;
+    }
+
+    fn unlink(&mut self, lvl: &mut Level, i: u32) {
+        let (prev, next, qty) = {
+            let n = &self.nodes[i as usize];
+            (n.prev, n.next, n.qty)
+        };
+        if prev == NIL {
+            lvl.head = next;
+        } else {
+            self.nodes[prev as usize].next = next;
+        }
+        if next == NIL {
+            lvl.tail = prev;
+        } else {
+            self.nodes[next as usize].prev = prev;
+        }
+        lvl.vol -= qty;
+        self.free.push(i);
+    }
+}
+
+/// (bid oid, ask oid, px tick, qty, ts)
+pub type Trade = (u64, u64, i64, i64, f64);
+
+pub struct Book {
+    pub bids: BTreeMap<i64, Level>,
+    pub asks: BTreeMap<i64, Level>,
+    slab: Slab,
+    index: FxHashMap<u64, (u8, i64, u32)>,
+    // ring of the most recent trades, oldest dropped once full
+    pub trades: VecDeque<Trade>,
+    trade_cap: usize,
+    next_oid: u64,
+}
+
+impl Book {
+    pub fn new(trade_cap: usize) -> Self {
+        Book {
+            bids: BTreeMap::new(),
+            asks: BTreeMap::new(),
+            slab: Slab::default(),
+            index: FxHashMap::default(),
+            trades: VecDeque::new(),
+            // rounded up to a power of two, as obook.lob does
+            trade_cap: trade_cap.max(1).next_power_of_two(),
+            next_oid: 0,
+        }
+    }
+
+    // walk the opposite side from its best level while it is within lim,
+    // filling oldest-first. returns the unfilled qty.
+    fn sweep(&mut self, side: u8, oid: u64, mut qty: i64, lim: i64, ts: f64) -> i64 {
+        let Book { bids, asks, slab, index, trades, trade_cap, .. } = self;
+        while qty > 0 {
+            let mut entry: OccupiedEntry<i64, Level> = if side == BUY {
+                match asks.first_entry() {
+                    Some(e) if *e.key() <= lim => e,
+                    _ => break,
+                }
+            } else {
+                match bids.last_entry() {
+                    Some(e) if *e.key() >= lim => e,
+                    _ => break,
+                }
+            };
+            let px = *entry.key();
+            let lvl = entry.get_mut();
+            while qty > 0 && lvl.head != NIL {
+                let i = lvl.head;
+                let (top_oid, top) = {
+                    let n = &slab.nodes[i as usize];
+                    (n.oid, n.qty)
+                };
+                let (b, a) = if side == BUY { (oid, top_oid) } else { (top_oid, oid) };
+                if trades.len() == *trade_cap {
+                    trades.pop_front();
+                }
+                if top <= qty {
+                    trades.push_back((b, a, px, top, ts));
+                    qty -= top;
+                    slab.unlink(lvl, i);
+                    index.remove(&top_oid);
+                } else {
+                    trades.push_back((b, a, px, qty, ts));
+                    slab.nodes[i as usize].qty -= qty;
+                    lvl.vol -= qty;
+                    qty = 0;
+                }
+            }
+            if lvl.head == NIL {
+                entry.remove();
+            }
+        }
+        qty
+    }
+
+    /// resting volume at `px` on `side`, 0 when there is no level
+    pub fn level_vol(&self, side: u8, px: i64) -> i64 {
+        let book = if side == BUY { &self.bids } else { &self.asks };
+        book.get(&px).map_or(0, |l| l.vol)
+    }
+
+    /// returns 0, touching nothing, if resting all of `qty` could push
+    /// the level's volume past i64 (matching only takes volume away)
+    pub fn limit(&mut self, side: u8, px: i64, qty: i64, ts: f64) -> u64 {
+        if qty > 0 && self.level_vol(side, px).checked_add(qty).is_none() {
+            return 0;
+        }
+        self.next_oid += 1;
+        let oid = self.next_oid;
+        let left = self.sweep(side, oid, qty, px, ts);
+        if left > 0 {
+            let i = self.slab.alloc(oid, left);
+            let book = if side == BUY { &mut self.bids } else { &mut self.asks };
+            let lvl = book.entry(px).or_insert_with(Level::new);
+            self.slab.push_back(lvl, i);
+            self.index.insert(oid, (side, px, i));
+        }
+        oid
+    }
+
+    pub fn market(&mut self, side: u8, qty: i64, ts: f64) -> u64 {
+        self.next_oid += 1;
+        let oid = self.next_oid;
+        let lim = if side == BUY { i64::MAX } else { i64::MIN };
+        self.sweep(side, oid, qty, lim, ts);
+        oid
+    }
+
+    pub fn cancel(&mut self, oid: u64) -> bool {
+        let Some((side, px, i)) = self.index.remove(&oid) else {
+            return false;
+        };
+        let book = if side == BUY { &mut self.bids } else { &mut self.asks };
+        if let Some(lvl) = book.get_mut(&px) {
+            self.slab.unlink(lvl, i);
+            if lvl.head == NIL {
+                book.remove(&px);
+            }
+        }
+        true
+    }
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn fifo_within_a_level() {
+        let mut b = Book::new(16);
+        let a1 = b.limit(SELL, 10100, 5, 0.0);
+        let a2 = b.limit(SELL, 10100, 5, 0.0);
+        let a3 = b.limit(SELL, 10000, 5, 0.0);
+        let m = b.market(BUY, 12, 1.0);
+        let got: Vec<_> = b.trades.iter().map(|t| (t.0, t.1, t.2, t.3)).collect();
+        assert_eq!(got, vec![(m, a3, 10000, 5), (m, a1, 10100, 5), (m, a2, 10100, 2)]);
+        assert_eq!(b.asks[&10100].vol, 3);
+    }
+
+    #[test]
+    fn cancel_drops_an_emptied_level() {
+        let mut b = Book::new(16);
+        let oid = b.limit(BUY, 9900, 5, 0.0);
+        assert!(b.cancel(oid));
+        assert!(!b.cancel(oid));
+        assert!(b.bids.is_empty());
+    }
+
+    #[test]
+    fn level_volume_cannot_overflow() {
+        let mut b = Book::new(16);
+        assert_eq!(b.limit(SELL, 10000, 1 << 62, 0.0), 1);
+        assert_eq!(b.limit(SELL, 10000, 1 << 62, 0.0), 0);
+        assert_eq!(b.asks[&10000].vol, 1 << 62);
+        assert_eq!(b.limit(SELL, 10001, 1 << 62, 0.0), 2);
+    }
+
+    #[test]
+    fn trade_cap_rounds_up_like_obook() {
+        let mut b = Book::new(1000);
+        for _ in 0..1100 {
+            b.limit(SELL, 10000, 1, 0.0);
+        }
+        b.market(BUY, 1100, 0.0);
+        assert_eq!(b.trades.len(), 1024);
+    }
+}
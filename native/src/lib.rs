@@ -0,0 +1,160 @@
+// c abi over the matching core in book.rs, loaded by obook.native_lob
+// through ctypes. the python side converts prices to ticks and checks
+// sides and quantities before calling in; the one check made here is that
+// an order can't overflow its level's volume, which needs the book.
+// every function takes the *mut Book handed out by obn_new.
+
+pub mod book;
+
+use std::slice;
+
+use rustc_hash::FxHashMap;
+
+use book::{Book, BUY};
+
+#[no_mangle]
+pub extern "C" fn obn_new(trade_cap: usize) -> *mut Book {
+    Box::into_raw(Box::new(Book::new(trade_cap)))
+}
+
+/// # Safety
+/// `b` must come from obn_new and not be used again.
+#[no_mangle]
+pub unsafe extern "C" fn obn_free(b: *mut Book) {
+    if !b.is_null() {
+        drop(Box::from_raw(b));
+    }
+}
+
+/// # Safety
+/// `b` must be a live book from obn_new.
+#[no_mangle]
+pub unsafe extern "C" fn obn_limit(b: *mut Book, side: u8, px: i64, qty: i64, ts: f64) -> u64 {
+    (*b).limit(side, px, qty, ts)
+}
+
+/// places nothing and returns false if the batch could push any level's
+/// volume past i64, as obn_limit would refuse one of its orders.
+///
+/// # Safety
+/// `b` must be a live book; the three inputs hold `n` entries and
+/// `oids` has room for `n`.
+#[no_mangle]
+pub unsafe extern "C" fn obn_limits(
+    b: *mut Book,
+    n: usize,
+    sides: *const u8,
+    pxs: *const i64,
+    qtys: *const i64,
+    ts: f64,
+    oids: *mut u64,
+) -> bool {
+    let b = &mut *b;
+    let sides = slice::from_raw_parts(sides, n);
+    let pxs = slice::from_raw_parts(pxs, n);
+    let qtys = slice::from_raw_parts(qtys, n);
+    let oids = slice::from_raw_parts_mut(oids, n);
+    let mut add: FxHashMap<(u8, i64), i64> = FxHashMap::default();
+    for k in 0..n {
+        if qtys[k] > 0 {
+            let key = (sides[k], pxs[k]);
+            let v = *add.entry(key).or_insert_with(|| b.level_vol(key.0, key.1));
+            let Some(v) = v.checked_add(qtys[k]) else {
+                return false;
+            };
+            add.insert(key, v);
+        }
+    }
+    for k in 0..n {
+        oids[k] = b.limit(sides[k], pxs[k], qtys[k], ts);
+    }
+    true
+}
+
+/// # Safety
+/// `b` must be a live book from obn_new.
+#[no_mangle]
+pub unsafe extern "C" fn obn_market(b: *mut Book, side: u8, qty: i64, ts: f64) -> u64 {
+    (*b).market(side, qty, ts)
+}
+
+/// # Safety
+/// `b` must be a live book from obn_new.
+#[no_mangle]
+pub unsafe extern "C" fn obn_cancel(b: *mut Book, oid: u64) -> bool {
+    (*b).cancel(oid)
+}
+
+/// best `depth` levels of one side, best first, into px/vol.
+/// returns how many were written.
+///
+/// # Safety
+/// `b` must be a live book; px and vol have room for `depth`.
+#[no_mangle]
+pub unsafe extern "C" fn obn_depth(
+    b: *const Book,
+    side: u8,
+    depth: usize,
+    px: *mut i64,
+    vol: *mut i64,
+) -> usize {
+    let b = &*b;
+    let px = slice::from_raw_parts_mut(px, depth);
+    let vol = slice::from_raw_parts_mut(vol, depth);
+    let mut n = 0;
+    let mut put = |(p, l): (&i64, &book::Level)| {
+        px[n] = *p;
+        vol[n] = l.vol;
+        n += 1;
+    };
+    if side == BUY {
+        b.bids.iter().rev().take(depth).for_each(&mut put);
+    } else {
+        b.asks.iter().take(depth).for_each(&mut put);
+    }
+    n
+}
+
+/// # Safety
+/// `b` must be a live book from obn_new.
+#[no_mangle]
+pub unsafe extern "C" fn obn_trades_len(b: *const Book) -> usize {
+    (*b).trades.len()
+}
+
+/// copy the kept trades, oldest first, into column buffers that each
+/// have room for obn_trades_len entries.
+///
+/// # Safety
+/// `b` must be a live book; every column is long enough.
+#[no_mangle]
+pub unsafe extern "C" fn obn_trades(
+    b: *const Book,
+    bid: *mut u64,
+    ask: *mut u64,
+    px: *mut i64,
+    qty: *mut i64,
+    ts: *mut f64,
+) {
+    let t = &(*b).trades;
+    let n = t.len();
+    let bid = slice::from_raw_parts_mut(bid, n);
+    let ask = slice::from_raw_parts_mut(ask, n);
+    let px = slice::from_raw_parts_mut(px, n);
+    let qty = slice::from_raw_parts_mut(qty, n);
+    let ts = slice::from_raw_parts_mut(ts, n);
+    for (k, &(b, a, p, q, s)) in t.iter().enumerate() {
+        bid[k] = b;
+        ask[k] = a;
+        px[k] = p;
+        qty[k] = q;
+        ts[k] = s;
+    }
+}
+
+/// # Safety
+/// `b` must be a live book from obn_new.
+#[no_mangle]
+pub unsafe extern "C" fn obn_drop_trades(b: *mut Book) {
+    (*b).trades.clear();
+}
@@ -0,0 +1,39 @@
+# typed declarations for building obook.py as a Cython extension; the
+# .py stays the only source and still runs as-is under plain CPython.
+
+cimport cython
+
+
+cdef class _level:
+    cdef public object qty, oid
+    cdef public long head, tail, mask
+
+    @cython.locals(pos=long, j=long)
+    cpdef long push(self, long long qty, long long oid, dict idx)
+
+
+cdef class lob:
+    cdef readonly dict bids, asks
+    cdef readonly list bid_px, ask_px
+    cdef readonly dict bid_vol, ask_vol
+
+    cdef object _best_bid, _best_ask
+
+    cdef long long[::1] _t_bid, _t_ask, _t_px, _t_qty
+    cdef double[::1] _t_ts
+    cdef long _t_mask, _t_idx
+
+    cdef long _next_oid
+
+    cdef dict _idx
+    cdef list _spare
+
+    @cython.locals(book=dict, vol=dict, heap=list, sgn=int,
+                   t_mine='long long[::1]', t_theirs='long long[::1]',
+                   t_px='long long[::1]', t_qty='long long[::1]',
+                   t_ts='double[::1]', mask=long, idx=dict, spare=list,
+                   n=long, px='long long', lvl=_level, m=long, h=long,
+                   end=long, left='long long', j=long, top='long long',
+                   i=long, v='long long')
+    cpdef long long _fill(self, int side, long long oid, long long qty,
+                          long long lim, double ts)
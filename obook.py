@@ -1,154 +1,628 @@
 #!/usr/bin/env python3
 
-from collections import deque, defaultdict, namedtuple
-import bisect
+from array import array
+from collections import namedtuple
+import ctypes
+import heapq
+import os
 import random
+import sys
 import time
-import uuid
 
-order_t = namedtuple("order_t", ["oid", "side", "price", "qty", "ts"])
+# prices are held internally as integer ticks of 1/TICKS and only
+# converted back to floats at the api boundary
+TICKS = 100
+
+BUY = 0
+SELL = 1
+
 trade_t = namedtuple("trade_t", ["bid", "ask", "price", "qty", "ts"])
 
 
+# one-slot seed that int64 rings are stamped out from (seed * cap)
+_q0 = array("q", [0])
+
+
+# quantities are whole units held in int64 slots; check them before any
+# book state is touched so a bad qty can't leave half an order behind
+def _units(qty):
+    q = int(qty)
+    if q != qty:
+        raise ValueError("qty must be a whole number of units")
+    if not -(1 << 63) <= q < 1 << 63:
+        raise ValueError("qty must fit in an int64")
+    return q
+
+
+# prices become int64 ticks the same way in both books. -2**63 is out as
+# well: the bid heap and a sell's limit are negated, and that must fit.
+def _tick(px):
+    t = int(round(px * TICKS))
+    if not -(1 << 63) < t < 1 << 63:
+        raise ValueError("px must fit in an int64 once in ticks")
+    return t
+
+
+# a level's total resting qty is an int64 as well (cython's _fill, the
+# rust book). check an order against its own side's level before it can
+# match or rest; matching only takes volume away, so this is enough
+def _check_level(vol, px, qty):
+    if qty > 0 and vol.get(px, 0) + qty >= 1 << 63:
+        raise ValueError("level volume must fit in an int64")
+
+
+# both trade rings keep a power of two trades, at least one
+def _ring_cap(trade_cap):
+    return 1 << (max(trade_cap, 1) - 1).bit_length()
+
+
+# a price level is a fifo of (qty, oid) held as two int64 rings. head and
+# tail are absolute positions (slot = pos & mask), so the position an
+# order was pushed at stays valid while it rests, even across a grow.
+# cancelled orders stay in place with qty 0 until a match walks over them
+# or a full ring squeezes them out.
+class _level:
+    __slots__ = ("qty", "oid", "head", "tail", "mask")
+
+    def __init__(self, cap=16):
+        self.qty = _q0 * cap
+        self.oid = _q0 * cap
+        self.head = 0
+        self.tail = 0
+        self.mask = cap - 1
+
+    def push(self, qty, oid, idx):
+        pos = self.tail
+        if pos - self.head > self.mask:
+            pos = self._make_room(idx)
+        j = pos & self.mask
+        self.qty[j] = qty
+        self.oid[j] = oid
+        self.tail = pos + 1
+        return pos
+
+    def _make_room(self, idx):
+        # the ring is full. if at least half of it is cancelled slots,
+        # slide the live orders down over them (in place: every write goes
+        # to a slot already read) and re-point their oid -> position
+        # entries; only a ring that is mostly live doubles. either way the
+        # next full ring is at least cap / 2 pushes away.
+        qty, oid, mask = self.qty, self.oid, self.mask
+        live = 0
+        for pos in range(self.head, self.tail):
+            if qty[pos & mask]:
+                live += 1
+        if 2 * live > mask + 1:
+            self._grow()
+            return self.tail
+        dst = self.head
+        for pos in range(self.head, self.tail):
+            q = qty[pos & mask]
+            if q:
+                o = oid[pos & mask]
+                qty[dst & mask] = q
+                oid[dst & mask] = o
+                e = idx[o]
+                idx[o] = (e[0], e[1], dst)
+                dst += 1
+        self.tail = dst
+        return dst
+
+    def _grow(self):
+        mask = 2 * self.mask + 1
+        qty = _q0 * (mask + 1)
+        oid = _q0 * (mask + 1)
+        for pos in range(self.head, self.tail):
+            qty[pos & mask] = self.qty[pos & self.mask]
+            oid[pos & mask] = self.oid[pos & self.mask]
+        self.qty, self.oid, self.mask = qty, oid, mask
+
+
 class lob:
-    def __init__(self):
-        self.bids = defaultdict(deque)
-        self.asks = defaultdict(deque)
+    def __init__(self, trade_cap=1 << 16):
+        # tick -> level; a level exists exactly while it has orders
+        self.bids = {}
+        self.asks = {}
 
+        # heaps over price levels: asks as a min-heap, bids negated.
+        # the matcher pops a level it drains right away; levels removed
+        # any other way (cancel) leave a stale entry that is popped lazily
+        # whenever it surfaces at the top. stale entries below the top
+        # would never surface, so cancel rebuilds a heap once they
+        # outnumber the live levels.
         self.bid_px = []
         self.ask_px = []
 
-        self.trades = []
+        # resting qty per price level, kept in step with bids/asks
+        self.bid_vol = {}
+        self.ask_vol = {}
 
-    def _add_px(self, lst, px, desc=False):
-        if desc:
-            neg = [-x for x in lst]
-            idx = bisect.bisect_left(neg, -px)
-            if idx == len(lst) or lst[idx] != px:
-                lst.insert(idx, px)
-        else:
-            idx = bisect.bisect_left(lst, px)
-            if idx == len(lst) or lst[idx] != px:
-                lst.insert(idx, px)
+        # best prices in ticks (None for an empty side). raised as levels
+        # are added, re-read off the heap once a match has eaten into it
+        self._best_bid = None
+        self._best_ask = None
+
+        # trades go into preallocated columns used as a ring, so a fill
+        # is a handful of slot writes instead of a tuple + list append.
+        # once more than cap trades pile up the oldest are overwritten.
+        cap = _ring_cap(trade_cap)
+        self._t_bid = array("q", [0]) * cap
+        self._t_ask = array("q", [0]) * cap
+        self._t_px = array("q", [0]) * cap
+        self._t_qty = array("q", [0]) * cap
+        self._t_ts = array("d", [0.0]) * cap
+        self._t_mask = cap - 1
+        self._t_idx = 0
 
-    def _drop_px(self, mp, lst, px):
-        if not mp[px]:
-            del mp[px]
-            i = bisect.bisect_left(lst, px)
-            if i < len(lst) and lst[i] == px:
-                lst.pop(i)
+        self._next_oid = 0
+
+        # resting oid -> (side, tick, position in its level)
+        self._idx = {}
+
+        # emptied levels, reset and kept for reuse so new prices don't
+        # have to allocate fresh rings. only rings of up to 64 slots are
+        # kept; a level that grew bigger is let go with its last order
+        self._spare = []
+
+    def _top_bid(self):
+        heap = self.bid_px
+        while heap and -heap[0] not in self.bids:
+            heapq.heappop(heap)
+        self._best_bid = -heap[0] if heap else None
+
+    def _top_ask(self):
+        heap = self.ask_px
+        while heap and heap[0] not in self.asks:
+            heapq.heappop(heap)
+        self._best_ask = heap[0] if heap else None
 
     def add_limit(self, side, px, qty, ts=None):
+        if side != BUY and side != SELL:
+            raise ValueError("side must be BUY or SELL")
+        qty = _units(qty)
+        px = _tick(px)
+        _check_level(self.bid_vol if side == BUY else self.ask_vol, px, qty)
         ts = ts or time.time()
-        oid = str(uuid.uuid4())[:8]
-        o = order_t(oid, side, px, qty, ts)
-
-        if side == "buy":
-            o = self._hit_asks(o)
-            if o.qty > 0:
-                self.bids[px].append(o)
-                self._add_px(self.bid_px, px, desc=True)
+        self._next_oid += 1
+        oid = self._next_oid
+
+        # most limit orders don't cross: against the cached best they can
+        # skip the matcher call entirely and go straight to resting
+        if side == BUY:
+            ba = self._best_ask
+            if ba is not None and px >= ba:
+                qty = self._fill(BUY, oid, qty, px, ts)
+            if qty > 0:
+                if px not in self.bids:
+                    heapq.heappush(self.bid_px, -px)
+                    spare = self._spare
+                    self.bids[px] = spare.pop() if spare else _level()
+                    self.bid_vol[px] = 0
+                    if self._best_bid is None or px > self._best_bid:
+                        self._best_bid = px
+                self._idx[oid] = (side, px,
+                                  self.bids[px].push(qty, oid, self._idx))
+                self.bid_vol[px] += qty
         else:
-            o = self._hit_bids(o)
-            if o.qty > 0:
-                self.asks[px].append(o)
-                self._add_px(self.ask_px, px)
+            bb = self._best_bid
+            if bb is not None and px <= bb:
+                qty = self._fill(SELL, oid, qty, px, ts)
+            if qty > 0:
+                if px not in self.asks:
+                    heapq.heappush(self.ask_px, px)
+                    spare = self._spare
+                    self.asks[px] = spare.pop() if spare else _level()
+                    self.ask_vol[px] = 0
+                    if self._best_ask is None or px < self._best_ask:
+                        self._best_ask = px
+                self._idx[oid] = (side, px,
+                                  self.asks[px].push(qty, oid, self._idx))
+                self.ask_vol[px] += qty
 
         return oid
 
+    def add_limits_batch(self, sides, pxs, qtys, ts=None):
+        if not len(sides) == len(pxs) == len(qtys):
+            raise ValueError("sides, pxs and qtys must be the same length")
+        for s in sides:
+            if s != BUY and s != SELL:
+                raise ValueError("side must be BUY or SELL")
+        qtys = [_units(q) for q in qtys]
+        ticks = [_tick(px) for px in pxs]
+        add = {}
+        for s, px, q in zip(sides, ticks, qtys):
+            if q > 0:
+                add[s, px] = add.get((s, px), 0) + q
+        for (s, px), q in add.items():
+            _check_level(self.bid_vol if s == BUY else self.ask_vol, px, q)
+        ts = ts or time.time()
+        bids, asks = self.bids, self.asks
+        bid_px, ask_px = self.bid_px, self.ask_px
+        bb, ba = self._best_bid, self._best_ask
+        idx = self._idx
+        spare = self._spare
+
+        # if the highest buy (book or batch) is still below the lowest
+        # sell, no order in the batch can trade and they all just rest
+        hi = max([t for s, t in zip(sides, ticks) if s == BUY],
+                 default=-sys.maxsize)
+        lo = min([t for s, t in zip(sides, ticks) if s != BUY],
+                 default=sys.maxsize)
+        if bb is not None:
+            hi = max(hi, bb)
+        if ba is not None:
+            lo = min(lo, ba)
+        if hi >= lo:
+            return [self.add_limit(s, px, q, ts)
+                    for s, px, q in zip(sides, pxs, qtys)]
+
+        first = self._next_oid + 1
+        self._next_oid += len(ticks)
+        groups = {}
+        for oid, s, px, q in zip(range(first, self._next_oid + 1),
+                                 sides, ticks, qtys):
+            if q > 0:
+                g = groups.get((s, px))
+                if g is None:
+                    g = groups[s, px] = ([], [])
+                g[0].append(q)
+                g[1].append(oid)
+
+        for (s, px), (gq, go) in groups.items():
+            if s == BUY:
+                if px not in bids:
+                    heapq.heappush(bid_px, -px)
+                    bids[px] = spare.pop() if spare else _level()
+                    self.bid_vol[px] = 0
+                    if bb is None or px > bb:
+                        bb = px
+                level = bids[px]
+                self.bid_vol[px] += sum(gq)
+            else:
+                if px not in asks:
+                    heapq.heappush(ask_px, px)
+                    asks[px] = spare.pop() if spare else _level()
+                    self.ask_vol[px] = 0
+                    if ba is None or px < ba:
+                        ba = px
+                level = asks[px]
+                self.ask_vol[px] += sum(gq)
+            push = level.push
+            for q, oid in zip(gq, go):
+                idx[oid] = (s, px, push(q, oid, idx))
+        self._best_bid, self._best_ask = bb, ba
+
+        return list(range(first, self._next_oid + 1))
+
     def add_market(self, side, qty, ts=None):
+        if side != BUY and side != SELL:
+            raise ValueError("side must be BUY or SELL")
+        qty = _units(qty)
         ts = ts or time.time()
-        oid = str(uuid.uuid4())[:8]
-        o = order_t(oid, side, None, qty, ts)
-        if side == "buy":
-            self._mkt_buy(o)
-        else:
-            self._mkt_sell(o)
+        self._next_oid += 1
+        oid = self._next_oid
+        lim = sys.maxsize if side == BUY else -sys.maxsize
+        self._fill(side, oid, qty, lim, ts)
         return oid
 
     # matching stuff
+    # market orders go through the same loops with an unbounded limit.
+    # every fill from one order is stamped with that order's ts.
+    # a fill either consumes the whole resting head (and keeps going) or
+    # finishes the incoming order against it; there is no third case.
+    # cancelled heads (qty 0) are just dropped.
 
-    def _hit_asks(self, o):
-        while o.qty > 0 and self.ask_px and self.ask_px[0] <= o.price:
-            px = self.ask_px[0]
-            q = self.asks[px]
-            while q and o.qty > 0:
-                top = q[0]
-                fill = min(o.qty, top.qty)
-                t = trade_t(o.oid, top.oid, px, fill, time.time())
-                self.trades.append(t)
-                o = o._replace(qty=o.qty - fill)
-                top = top._replace(qty=top.qty - fill)
-                q[0] = top
-                if top.qty == 0:
-                    q.popleft()
-            self._drop_px(self.asks, self.ask_px, px)
-        return o
-
-    def _hit_bids(self, o):
-        while o.qty > 0 and self.bid_px and self.bid_px[0] >= o.price:
-            px = self.bid_px[0]
-            q = self.bids[px]
-            while q and o.qty > 0:
-                top = q[0]
-                fill = min(o.qty, top.qty)
-                t = trade_t(top.oid, o.oid, px, fill, time.time())
-                self.trades.append(t)
-                o = o._replace(qty=o.qty - fill)
-                top = top._replace(qty=top.qty - fill)
-                q[0] = top
-                if top.qty == 0:
-                    q.popleft()
-            self._drop_px(self.bids, self.bid_px, px)
-        return o
-
-    def _mkt_buy(self, o):
-        while o.qty > 0 and self.ask_px:
-            px = self.ask_px[0]
-            q = self.asks[px]
-            while q and o.qty > 0:
-                top = q[0]
-                fill = min(o.qty, top.qty)
-                t = trade_t(o.oid, top.oid, px, fill, time.time())
-                self.trades.append(t)
-                o = o._replace(qty=o.qty - fill)
-                top = top._replace(qty=top.qty - fill)
-                q[0] = top
-                if top.qty == 0:
-                    q.popleft()
-            self._drop_px(self.asks, self.ask_px, px)
-
-    def _mkt_sell(self, o):
-        while o.qty > 0 and self.bid_px:
-            px = self.bid_px[0]
-            q = self.bids[px]
-            while q and o.qty > 0:
-                top = q[0]
-                fill = min(o.qty, top.qty)
-                t = trade_t(top.oid, o.oid, px, fill, time.time())
-                self.trades.append(t)
-                o = o._replace(qty=o.qty - fill)
-                top = top._replace(qty=top.qty - fill)
-                q[0] = top
-                if top.qty == 0:
-                    q.popleft()
-            self._drop_px(self.bids, self.bid_px, px)
+    def _fill(self, side, oid, qty, lim, ts):
+        # a buy walks the asks min-heap as is, a sell walks the bids heap of
+        # negated ticks. with key = sgn * px both are "pop the min-heap while
+        # key <= sgn * lim", so one body serves both sides once the book,
+        # heap, sign and trade columns are picked. a plain method (not a
+        # closure) so obook.pxd can type the loop for the cython build.
+        if side == BUY:
+            book, vol, heap, sgn = self.asks, self.ask_vol, self.ask_px, 1
+            t_mine, t_theirs = self._t_bid, self._t_ask
+        else:
+            book, vol, heap, sgn = self.bids, self.bid_vol, self.bid_px, -1
+            t_mine, t_theirs = self._t_ask, self._t_bid
+        t_px = self._t_px
+        t_qty = self._t_qty
+        t_ts = self._t_ts
+        mask = self._t_mask
+        idx = self._idx
+        spare = self._spare
+        heappop = heapq.heappop
+
+        n = self._t_idx
+        lim *= sgn
+        while qty > 0 and heap and heap[0] <= lim:
+            px = sgn * heap[0]
+            if px not in book:
+                heappop(heap)
+                continue
+            lvl = book[px]
+            lq = lvl.qty
+            lo = lvl.oid
+            m = lvl.mask
+            h = lvl.head
+            end = lvl.tail
+            left = qty
+            while qty and h != end:
+                j = h & m
+                top = lq[j]
+                if not top:
+                    h += 1
+                    continue
+                i = n & mask
+                t_mine[i] = oid
+                t_theirs[i] = lo[j]
+                t_px[i] = px
+                t_ts[i] = ts
+                n += 1
+                if top <= qty:
+                    t_qty[i] = top
+                    qty -= top
+                    del idx[lo[j]]
+                    h += 1
+                    continue
+                t_qty[i] = qty
+                lq[j] = top - qty
+                qty = 0
+            v = vol[px] - (left - qty)
+            if v:
+                vol[px] = v
+                lvl.head = h
+            else:
+                # the drained level is the one at heap[0]: drop it from
+                # the index here instead of leaving it stale
+                del book[px]
+                del vol[px]
+                heappop(heap)
+                lvl.head = lvl.tail = 0
+                if lvl.mask < 64:
+                    spare.append(lvl)
+        if n != self._t_idx:
+            self._t_idx = n
+            if side == BUY:
+                self._top_ask()
+            else:
+                self._top_bid()
+        return qty
+
+    def cancel(self, oid):
+        e = self._idx.pop(oid, None)
+        if e is None:
+            return False
+        side, px, pos = e
+        if side == BUY:
+            book, vol = self.bids, self.bid_vol
+        else:
+            book, vol = self.asks, self.ask_vol
+        lvl = book[px]
+        j = pos & lvl.mask
+        vol[px] -= lvl.qty[j]
+        lvl.qty[j] = 0
+        # only cancelled entries left: the level goes, its heap entry
+        # turns stale and is skipped like any other
+        if not vol[px]:
+            del book[px]
+            del vol[px]
+            lvl.head = lvl.tail = 0
+            if lvl.mask < 64:
+                self._spare.append(lvl)
+            if side == BUY:
+                if px == self._best_bid:
+                    self._top_bid()
+                elif len(self.bid_px) > 2 * len(book) + 16:
+                    self._rebuild(self.bid_px, [-p for p in book])
+            elif px == self._best_ask:
+                self._top_ask()
+            elif len(self.ask_px) > 2 * len(book) + 16:
+                self._rebuild(self.ask_px, list(book))
+        return True
+
+    def _rebuild(self, heap, keys):
+        # in place, so bid_px/ask_px stay the same list objects
+        heap[:] = keys
+        heapq.heapify(heap)
 
     # misc
 
     def best_bid(self):
-        return self.bid_px[0] if self.bid_px else None
+        b = self._best_bid
+        return b / TICKS if b is not None else None
 
     def best_ask(self):
-        return self.ask_px[0] if self.ask_px else None
+        a = self._best_ask
+        return a / TICKS if a is not None else None
+
+    def best_bid_vol(self):
+        b = self._best_bid
+        return self.bid_vol[b] if b is not None else 0
+
+    def best_ask_vol(self):
+        a = self._best_ask
+        return self.ask_vol[a] if a is not None else 0
+
+    def _heap_top(self, heap, book, sgn, depth):
+        # the best depth live ticks, read off the heap without popping: a
+        # second heap of (key, slot) frontier entries walks the tree in
+        # key order instead of scanning every level. it visits
+        # v = O(depth + stale) slots, and each visit pushes up to two
+        # children onto the frontier, so the whole walk is O(v log v).
+        # a tick may sit in the heap twice (stale, then re-added) so it is
+        # only taken once.
+        out = []
+        seen = set()
+        todo = [(heap[0], 0)] if heap else []
+        size = len(heap)
+        while todo and len(out) < depth:
+            key, k = heapq.heappop(todo)
+            px = sgn * key
+            if px in book and px not in seen:
+                seen.add(px)
+                out.append(px)
+            for c in (2 * k + 1, 2 * k + 2):
+                if c < size:
+                    heapq.heappush(todo, (heap[c], c))
+        return out
 
     def snap(self, depth=5):
-        b = [(p, sum(x.qty for x in self.bids[p])) for p in self.bid_px[:depth]]
-        a = [(p, sum(x.qty for x in self.asks[p])) for p in self.ask_px[:depth]]
+        b = [(p / TICKS, self.bid_vol[p])
+             for p in self._heap_top(self.bid_px, self.bids, -1, depth)]
+        a = [(p / TICKS, self.ask_vol[p])
+             for p in self._heap_top(self.ask_px, self.asks, 1, depth)]
         return {"bids": b, "asks": a}
 
+    @property
+    def trades(self):
+        t_bid = self._t_bid
+        t_ask = self._t_ask
+        t_px = self._t_px
+        t_qty = self._t_qty
+        t_ts = self._t_ts
+        mask = self._t_mask
+        n = self._t_idx
+        out = []
+        for i in range(max(0, n - mask - 1), n):
+            i &= mask
+            out.append(trade_t(t_bid[i], t_ask[i], t_px[i] / TICKS,
+                               t_qty[i], t_ts[i]))
+        return out
+
     def drop_trades(self):
-        self.trades = []
+        self._t_idx = 0
+
+
+# optional rust backend: native/ builds the matching core as a shared
+# library with a c abi (cargo build --release) and native_lob drives it
+# through ctypes with the same interface as lob. OBOOK_NATIVE can point
+# at the library; native_lob is None when it isn't there.
+
+def _load_native():
+    path = os.environ.get("OBOOK_NATIVE")
+    if path is None:
+        name = {"darwin": "libobook_native.dylib",
+                "win32": "obook_native.dll"}.get(sys.platform,
+                                                 "libobook_native.so")
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "native", "target", "release", name)
+    try:
+        lib = ctypes.CDLL(path)
+    except OSError:
+        return None
+    c = ctypes
+    p = c.c_void_p
+    for fn, res, args in [
+        ("obn_new", p, [c.c_size_t]),
+        ("obn_free", None, [p]),
+        ("obn_limit", c.c_uint64,
+         [p, c.c_uint8, c.c_int64, c.c_int64, c.c_double]),
+        ("obn_limits", c.c_bool, [p, c.c_size_t, p, p, p, c.c_double, p]),
+        ("obn_market", c.c_uint64, [p, c.c_uint8, c.c_int64, c.c_double]),
+        ("obn_cancel", c.c_bool, [p, c.c_uint64]),
+        ("obn_depth", c.c_size_t, [p, c.c_uint8, c.c_size_t, p, p]),
+        ("obn_trades_len", c.c_size_t, [p]),
+        ("obn_trades", None, [p, p, p, p, p, p]),
+        ("obn_drop_trades", None, [p]),
+    ]:
+        f = getattr(lib, fn)
+        f.restype = res
+        f.argtypes = args
+    return lib
+
+
+_native = _load_native()
+
+
+class _native_lob:
+    def __init__(self, trade_cap=1 << 16):
+        self._b = _native.obn_new(_ring_cap(trade_cap))
+        self._limit = _native.obn_limit
+        self._market = _native.obn_market
+
+    def __del__(self):
+        b, self._b = getattr(self, "_b", None), None
+        if b:
+            _native.obn_free(b)
+
+    def add_limit(self, side, px, qty, ts=None):
+        if side != BUY and side != SELL:
+            raise ValueError("side must be BUY or SELL")
+        qty = _units(qty)
+        oid = self._limit(self._b, side, _tick(px), qty, ts or time.time())
+        if not oid:
+            raise ValueError("level volume must fit in an int64")
+        return oid
+
+    def add_limits_batch(self, sides, pxs, qtys, ts=None):
+        if not len(sides) == len(pxs) == len(qtys):
+            raise ValueError("sides, pxs and qtys must be the same length")
+        for s in sides:
+            if s != BUY and s != SELL:
+                raise ValueError("side must be BUY or SELL")
+        q = array("q", [_units(x) for x in qtys])
+        s = array("B", sides)
+        t = array("q", [_tick(px) for px in pxs])
+        out = array("Q", [0]) * len(s)
+        if len(s):
+            ok = _native.obn_limits(self._b, len(s), s.buffer_info()[0],
+                                    t.buffer_info()[0], q.buffer_info()[0],
+                                    ts or time.time(), out.buffer_info()[0])
+            if not ok:
+                raise ValueError("level volume must fit in an int64")
+        return out.tolist()
+
+    def add_market(self, side, qty, ts=None):
+        if side != BUY and side != SELL:
+            raise ValueError("side must be BUY or SELL")
+        qty = _units(qty)
+        return self._market(self._b, side, qty, ts or time.time())
+
+    def cancel(self, oid):
+        return _native.obn_cancel(self._b, oid)
+
+    def _depth(self, side, depth):
+        px = array("q", [0]) * depth
+        vol = array("q", [0]) * depth
+        n = _native.obn_depth(self._b, side, depth, px.buffer_info()[0],
+                              vol.buffer_info()[0]) if depth else 0
+        return [(px[k] / TICKS, vol[k]) for k in range(n)]
+
+    def best_bid(self):
+        b = self._depth(BUY, 1)
+        return b[0][0] if b else None
+
+    def best_ask(self):
+        a = self._depth(SELL, 1)
+        return a[0][0] if a else None
+
+    def best_bid_vol(self):
+        b = self._depth(BUY, 1)
+        return b[0][1] if b else 0
+
+    def best_ask_vol(self):
+        a = self._depth(SELL, 1)
+        return a[0][1] if a else 0
+
+    def snap(self, depth=5):
+        return {"bids": self._depth(BUY, depth),
+                "asks": self._depth(SELL, depth)}
+
+    @property
+    def trades(self):
+        n = _native.obn_trades_len(self._b)
+        cols = [array(tc, [0]) * n for tc in "QQqqd"]
+        if n:
+            _native.obn_trades(self._b, *[c.buffer_info()[0] for c in cols])
+        t_bid, t_ask, t_px, t_qty, t_ts = cols
+        return [trade_t(t_bid[k], t_ask[k], t_px[k] / TICKS, t_qty[k],
+                        t_ts[k]) for k in range(n)]
+
+    def drop_trades(self):
+        _native.obn_drop_trades(self._b)
+
+
+native_lob = _native_lob if _native is not None else None
 
 
 # lazy benchmark
@@ -157,29 +631,58 @@ def rand_px(base=100, wiggle=5):
     return round(base + random.randint(-wiggle, wiggle) + random.random(), 2)
 
 
-def bench(n=10000, seed=1):
+def bench(n=10000, seed=1, book=lob, samples=1000):
     random.seed(seed)
-    ob = lob()
-    t0 = time.perf_counter()
-    lat = []
+    # draw the whole order stream before the clock starts, in the same
+    # sequence as drawing it inline, so timing only covers the book
+    orders = []
     for _ in range(n):
-        s = random.choice(["buy", "sell"])
+        s = random.choice([BUY, SELL])
         if random.random() < 0.9:
-            px = rand_px(100, 10)
-            q = random.randint(1, 10)
-            t1 = time.perf_counter()
-            ob.add_limit(s, px, q)
-            t2 = time.perf_counter()
+            orders.append((s, rand_px(100, 10), random.randint(1, 10)))
         else:
-            q = random.randint(1, 20)
-            t1 = time.perf_counter()
-            ob.add_market(s, q)
-            t2 = time.perf_counter()
-        lat.append((t2 - t1) * 1e6)
+            orders.append((s, None, random.randint(1, 20)))
+
+    # throughput: one clock read either side of the whole stream
+    ob = book()
+    add_limit, add_market = ob.add_limit, ob.add_market
+    t0 = time.perf_counter()
+    for s, px, q in orders:
+        if px is not None:
+            add_limit(s, px, q)
+        else:
+            add_market(s, q)
     tot = time.perf_counter() - t0
+
+    # latency: replay the same stream on a fresh book and clock only
+    # every step-th order, so most calls run without timer overhead
+    step = max(1, n // samples)
+    lat = array("q", [0]) * len(range(0, n, step))
+    ob2 = book()
+    add_limit, add_market = ob2.add_limit, ob2.add_market
+    clock = time.perf_counter_ns
+    k = 0
+    for i, (s, px, q) in enumerate(orders):
+        if i % step:
+            if px is not None:
+                add_limit(s, px, q)
+            else:
+                add_market(s, q)
+            continue
+        t1 = clock()
+        if px is not None:
+            add_limit(s, px, q)
+        else:
+            add_market(s, q)
+        lat[k] = clock() - t1
+        k += 1
+    lat = sorted(lat)
+
     print("done", n, "orders in", round(tot, 3), "sec",
           "|", int(n / tot), "ops/s",
-          "| avg", round(sum(lat) / len(lat), 2), "us")
+          "| avg", round(sum(lat) / len(lat) / 1e3, 2), "us",
+          "| p50", round(lat[len(lat) // 2] / 1e3, 2), "us",
+          "| p99", round(lat[len(lat) * 99 // 100] / 1e3, 2), "us")
     print("top:", ob.snap(3))
     return ob
 
@@ -187,11 +690,13 @@ def bench(n=10000, seed=1):
 if __name__ == "__main__":
     ob = lob()
     for p in [99.5, 100.0, 100.5]:
-        ob.add_limit("sell", p, 100)
-        ob.add_limit("buy", p - 1, 100)
+        ob.add_limit(SELL, p, 100)
+        ob.add_limit(BUY, p - 1, 100)
 
-    ob.add_market("buy", 50)
+    ob.add_market(BUY, 50)
     print("trades:", ob.trades)
     ob.drop_trades()
 
     bench(5000)
+    if native_lob is not None:
+        bench(5000, book=native_lob)
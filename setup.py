@@ -0,0 +1,15 @@
+from setuptools import setup
+from Cython.Build import cythonize
+
+# optional: python setup.py build_ext --inplace compiles obook.py (typed
+# by obook.pxd) into an extension that `import obook` then picks up
+
+setup(
+    name="obook",
+    py_modules=["obook"],
+    ext_modules=cythonize("obook.py", compiler_directives={
+        "language_level": 3,
+        "boundscheck": False,
+        "wraparound": False,
+    }),
+)
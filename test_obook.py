@@ -0,0 +1,361 @@
+import contextlib
+import io
+import random
+import unittest
+
+import obook
+from obook import BUY, SELL, lob
+
+
+# naive book to check against: one flat list of resting orders, every
+# match rescans it for the best price and then the oldest order there
+class naive:
+    def __init__(self):
+        self.book = []  # [seq, side, px, qty, oid]
+        self.trades = []
+        self.seq = 0
+
+    def _match(self, side, px, qty, oid):
+        while qty > 0:
+            if side == BUY:
+                opp = [o for o in self.book
+                       if o[1] == SELL and (px is None or o[2] <= px)]
+                key = lambda o: (o[2], o[0])
+            else:
+                opp = [o for o in self.book
+                       if o[1] == BUY and (px is None or o[2] >= px)]
+                key = lambda o: (-o[2], o[0])
+            if not opp:
+                break
+            best = min(opp, key=key)
+            f = min(qty, best[3])
+            qty -= f
+            best[3] -= f
+            if side == BUY:
+                self.trades.append((oid, best[4], best[2], f))
+            else:
+                self.trades.append((best[4], oid, best[2], f))
+            if not best[3]:
+                self.book.remove(best)
+        return qty
+
+    def add(self, side, px, qty, oid):
+        left = self._match(side, px, qty, oid)
+        if px is not None and left > 0:
+            self.seq += 1
+            self.book.append([self.seq, side, px, left, oid])
+
+    def cancel(self, oid):
+        for o in self.book:
+            if o[4] == oid:
+                self.book.remove(o)
+                return True
+        return False
+
+    def snap(self, depth):
+        lv = {}
+        for _, s, px, q, _ in self.book:
+            lv[s, px] = lv.get((s, px), 0) + q
+        b = sorted([(p, q) for (s, p), q in lv.items() if s == BUY],
+                   reverse=True)
+        a = sorted([(p, q) for (s, p), q in lv.items() if s == SELL])
+        return {"bids": b[:depth], "asks": a[:depth]}
+
+
+def rand_px(rnd, wiggle=10):
+    return round(100 + rnd.randint(-wiggle, wiggle) + rnd.random(), 2)
+
+
+class against_naive(unittest.TestCase):
+    # drive lob and the naive book with the same seeded stream of limits,
+    # markets, cancels and batches; oids on the naive side are stream
+    # positions so both books see the same fifo order
+
+    book = lob
+
+    def check_top(self, ob, ref):
+        self.assertEqual(ob.snap(5), ref.snap(5))
+        bb, ba = ref.snap(1)["bids"], ref.snap(1)["asks"]
+        self.assertEqual(ob.best_bid(), bb[0][0] if bb else None)
+        self.assertEqual(ob.best_ask(), ba[0][0] if ba else None)
+        self.assertEqual(ob.best_bid_vol(), bb[0][1] if bb else 0)
+        self.assertEqual(ob.best_ask_vol(), ba[0][1] if ba else 0)
+
+    def run_stream(self, seed, n=2000, cancels=0.0, batches=0.0, wiggle=10):
+        rnd = random.Random(seed)
+        ob, ref = self.book(), naive()
+        name = {}
+        live = []
+        i = 0
+        while i < n:
+            x = rnd.random()
+            if x < batches:
+                # half the batches are placed far from the touch so they
+                # take the no-cross fast path
+                wide = rnd.random() < 0.5
+                sides, pxs, qtys = [], [], []
+                for _ in range(rnd.randint(1, 30)):
+                    s = rnd.choice([BUY, SELL])
+                    px = rand_px(rnd, wiggle)
+                    if wide:
+                        px = round(px - 20 if s == BUY else px + 20, 2)
+                    sides.append(s)
+                    pxs.append(px)
+                    qtys.append(rnd.randint(1, 10))
+                oids = ob.add_limits_batch(sides, pxs, qtys)
+                self.assertEqual(len(oids), len(sides))
+                for s, px, q, oid in zip(sides, pxs, qtys, oids):
+                    name[oid] = i
+                    ref.add(s, px, q, i)
+                    live.append(oid)
+                    i += 1
+                continue
+            if x < batches + cancels and live:
+                oid = live.pop(rnd.randrange(len(live)))
+                self.assertEqual(ob.cancel(oid), ref.cancel(name[oid]))
+                continue
+            s = rnd.choice([BUY, SELL])
+            if rnd.random() < 0.9:
+                px = rand_px(rnd, wiggle)
+                q = rnd.randint(1, 10)
+                oid = ob.add_limit(s, px, q)
+                ref.add(s, px, q, i)
+            else:
+                q = rnd.randint(1, 20)
+                oid = ob.add_market(s, q)
+                ref.add(s, None, q, i)
+            self.assertNotIn(oid, name)
+            name[oid] = i
+            live.append(oid)
+            i += 1
+            if i % 7 == 0:
+                self.check_top(ob, ref)
+
+        got = [(name[t.bid], name[t.ask], t.price, t.qty) for t in ob.trades]
+        self.assertEqual(got, ref.trades)
+        self.assertEqual(ob.snap(50), ref.snap(50))
+
+    def test_limits_and_markets(self):
+        for seed in range(8):
+            with self.subTest(seed=seed):
+                self.run_stream(seed)
+
+    def test_cancels(self):
+        for seed in range(8):
+            with self.subTest(seed=seed):
+                self.run_stream(seed, cancels=0.2)
+
+    def test_batches(self):
+        for seed in range(8):
+            with self.subTest(seed=seed):
+                self.run_stream(seed, cancels=0.1, batches=0.05)
+
+    def test_narrow_book(self):
+        # few price levels, so levels are drained, cancelled out and
+        # reused over and over and their rings grow
+        for seed in range(8):
+            with self.subTest(seed=seed):
+                self.run_stream(seed, cancels=0.2, batches=0.05, wiggle=1)
+
+
+@unittest.skipIf(obook.native_lob is None, "native/ not built")
+class against_naive_native(against_naive):
+    book = obook.native_lob
+
+
+@unittest.skipIf(obook.native_lob is None, "native/ not built")
+class native_cases(unittest.TestCase):
+    def test_bad_input_leaves_book_untouched(self):
+        ob = obook.native_lob()
+        ob.add_limit(SELL, 101.0, 5)
+        for bad in ("buy", 2):
+            with self.assertRaisesRegex(ValueError, "side must be"):
+                ob.add_limit(bad, 99.0, 1)
+            with self.assertRaisesRegex(ValueError, "side must be"):
+                ob.add_market(bad, 1)
+        for bad in (1.5, 2 ** 63):
+            with self.assertRaises(ValueError):
+                ob.add_limit(BUY, 102.0, bad)
+        # ctypes would wrap these ticks instead of raising
+        for bad in (1e17, -1e17, float("nan")):
+            with self.assertRaises(ValueError):
+                ob.add_limit(BUY, bad, 1)
+            with self.assertRaises(ValueError):
+                ob.add_limits_batch([BUY, SELL], [99.0, bad], [1, 1])
+        with self.assertRaisesRegex(ValueError, "same length"):
+            ob.add_limits_batch([BUY, BUY], [99.0, 98.0, 97.0], [1, 2, 3])
+        self.assertEqual(ob.snap(), {"bids": [], "asks": [(101.0, 5)]})
+        self.assertEqual(ob.trades, [])
+
+    def test_trade_ring_matches_lob(self):
+        for cap, kept in ((0, 1), (1, 1), (3, 4), (1000, 1024)):
+            with self.subTest(cap=cap):
+                books = [lob(trade_cap=cap), obook.native_lob(trade_cap=cap)]
+                for ob in books:
+                    for _ in range(1100):
+                        ob.add_limit(SELL, 100.0, 1, ts=1.0)
+                    ob.add_market(BUY, 1100, ts=2.0)
+                self.assertEqual(books[0].trades, books[1].trades)
+                self.assertEqual(len(books[1].trades), kept)
+
+
+class book_cases(unittest.TestCase):
+    def test_cancel(self):
+        ob = lob()
+        a = ob.add_limit(BUY, 99.0, 5)
+        b = ob.add_limit(BUY, 99.0, 7)
+        self.assertTrue(ob.cancel(a))
+        self.assertFalse(ob.cancel(a))
+        self.assertEqual(ob.snap(), {"bids": [(99.0, 7)], "asks": []})
+        ob.add_market(SELL, 10)
+        self.assertEqual([(t.bid, t.qty) for t in ob.trades], [(b, 7)])
+        self.assertFalse(ob.cancel(b))
+        self.assertIsNone(ob.best_bid())
+
+    def test_ring_grow_keeps_positions(self):
+        # push past the initial ring size, then cancel across the grow
+        ob = lob()
+        oids = [ob.add_limit(SELL, 101.0, 1) for _ in range(100)]
+        for oid in oids[::3]:
+            self.assertTrue(ob.cancel(oid))
+        ob.add_market(BUY, 1000)
+        left = [o for k, o in enumerate(oids) if k % 3]
+        self.assertEqual([t.ask for t in ob.trades], left)
+        self.assertIsNone(ob.best_ask())
+
+    def test_requote_below_top_keeps_heap_bounded(self):
+        # add + cancel at a level under the best leaves a stale heap entry
+        # each round; they must not pile up
+        ob = lob()
+        ob.add_limit(BUY, 100.0, 1)
+        ob.add_limit(SELL, 101.0, 1)
+        for _ in range(5000):
+            ob.cancel(ob.add_limit(BUY, 90.0, 1))
+            ob.cancel(ob.add_limit(SELL, 110.0, 1))
+        self.assertLessEqual(len(ob.bid_px), 2 * len(ob.bids) + 17)
+        self.assertLessEqual(len(ob.ask_px), 2 * len(ob.asks) + 17)
+        self.assertEqual(ob.snap(), {"bids": [(100.0, 1)],
+                                     "asks": [(101.0, 1)]})
+
+    def test_requote_behind_front_keeps_ring_bounded(self):
+        # add + cancel behind a resting front order leaves cancelled slots
+        # the matcher never walks over; a full ring must squeeze them out
+        ob = lob()
+        front = ob.add_limit(BUY, 100.0, 1)
+        keep = []
+        for k in range(20000):
+            oid = ob.add_limit(BUY, 100.0, 1)
+            if k % 1000:
+                ob.cancel(oid)
+            else:
+                keep.append(oid)
+        self.assertLessEqual(ob.bids[10000].mask + 1, 64)
+        # positions moved by the squeeze still cancel and fill right
+        self.assertTrue(ob.cancel(keep.pop()))
+        ob.add_market(SELL, 100)
+        self.assertEqual([t.bid for t in ob.trades], [front] + keep)
+        self.assertEqual(ob.snap(), {"bids": [], "asks": []})
+
+    def test_bad_qty_leaves_book_untouched(self):
+        ob = lob()
+        ob.add_limit(SELL, 101.0, 5)
+        for bad in (1.5, "2", float("nan"), 2 ** 63, -2 ** 63 - 1):
+            with self.assertRaises((ValueError, TypeError)):
+                ob.add_limit(BUY, 99.0, bad)
+            with self.assertRaises((ValueError, TypeError)):
+                ob.add_limit(BUY, 102.0, bad)
+            with self.assertRaises((ValueError, TypeError)):
+                ob.add_market(BUY, bad)
+            with self.assertRaises((ValueError, TypeError)):
+                ob.add_limits_batch([BUY, BUY], [98.0, 97.0], [1, bad])
+        self.assertEqual(ob.snap(), {"bids": [], "asks": [(101.0, 5)]})
+        self.assertIsNone(ob.best_bid())
+        self.assertEqual(ob.trades, [])
+        # whole floats are still taken as units
+        ob.add_limit(BUY, 99.0, 3.0)
+        self.assertEqual(ob.snap()["bids"], [(99.0, 3)])
+
+    def test_level_volume_fits_int64(self):
+        big = 1 << 62
+        for book in (lob, obook.native_lob):
+            if book is None:
+                continue
+            with self.subTest(book=book.__name__):
+                ob = book()
+                ob.add_limit(SELL, 101.0, big)
+                with self.assertRaisesRegex(ValueError, "level volume"):
+                    ob.add_limit(SELL, 101.0, big)
+                with self.assertRaisesRegex(ValueError, "level volume"):
+                    ob.add_limits_batch([BUY, SELL], [99.0, 101.0], [1, big])
+                with self.assertRaisesRegex(ValueError, "level volume"):
+                    ob.add_limits_batch([SELL, SELL], [102.0, 102.0],
+                                        [big, big])
+                self.assertEqual(ob.snap(), {"bids": [],
+                                             "asks": [(101.0, big)]})
+                self.assertEqual(ob.best_ask_vol(), big)
+                # a full level still trades and cancels normally
+                ob.add_limit(SELL, 101.0, big - 1)
+                ob.add_market(BUY, 5)
+                self.assertEqual([t.qty for t in ob.trades], [5])
+                self.assertEqual(ob.best_ask_vol(), 2 * big - 6)
+                self.assertEqual(ob.add_limit(BUY, 99.0, 1), 4)
+
+    def test_bad_px_uses_no_oid(self):
+        ob = lob()
+        for bad in (None, float("nan"), float("inf"), "99", 1e17, -1e17):
+            with self.assertRaises((ValueError, TypeError, OverflowError)):
+                ob.add_limit(BUY, bad, 1)
+        self.assertEqual(ob.add_limit(BUY, 99.0, 1), 1)
+        self.assertEqual(ob.snap(), {"bids": [(99.0, 1)], "asks": []})
+
+    def test_batch_length_mismatch(self):
+        ob = lob()
+        with self.assertRaisesRegex(ValueError, "same length"):
+            ob.add_limits_batch([BUY, BUY], [99.0, 98.0, 97.0], [1, 2, 3])
+        with self.assertRaisesRegex(ValueError, "same length"):
+            ob.add_limits_batch([BUY, SELL], [99.0, 99.0], [1])
+        self.assertEqual(ob.snap(), {"bids": [], "asks": []})
+        self.assertEqual(ob.add_limits_batch([BUY], [99.0], [1]), [1])
+
+    def test_snap_skips_stale_and_repeated_ticks(self):
+        ob = lob()
+        for px in (100.0, 99.0, 98.0, 97.0):
+            ob.add_limit(BUY, px, 1)
+        # 99 leaves a stale heap entry, then comes back as a second one
+        ob.cancel(2)
+        ob.add_limit(BUY, 99.0, 4)
+        ob.cancel(3)
+        self.assertEqual(ob.snap(3)["bids"],
+                         [(100.0, 1), (99.0, 4), (97.0, 1)])
+        self.assertEqual(ob.snap(0), {"bids": [], "asks": []})
+
+    def test_trade_ring_keeps_latest(self):
+        ob = lob(trade_cap=4)
+        for _ in range(6):
+            ob.add_limit(SELL, 100.0, 1)
+        ob.add_market(BUY, 6)
+        self.assertEqual([t.ask for t in ob.trades], [3, 4, 5, 6])
+        ob.drop_trades()
+        self.assertEqual(ob.trades, [])
+
+    def test_bench_runs(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ob = obook.bench(300, samples=10)
+        self.assertIsInstance(ob, lob)
+
+    def test_bad_side_rejected(self):
+        ob = lob()
+        ob.add_limit(SELL, 101.0, 5)
+        for bad in ("buy", "sell", 2, None):
+            with self.assertRaisesRegex(ValueError, "side must be"):
+                ob.add_limit(bad, 99.0, 1)
+            with self.assertRaisesRegex(ValueError, "side must be"):
+                ob.add_market(bad, 1)
+            with self.assertRaisesRegex(ValueError, "side must be"):
+                ob.add_limits_batch([BUY, bad], [98.0, 97.0], [1, 1])
+        self.assertEqual(ob.snap(), {"bids": [], "asks": [(101.0, 5)]})
+        self.assertEqual(ob.trades, [])
+
+
+if __name__ == "__main__":
+    unittest.main()